@@ -6,8 +6,47 @@
 
 from __future__ import print_function
 
+import importlib
+import io
 import json
-import functools
+import pickle
+try:
+    from sys import intern
+except ImportError:
+    pass  # Python 2 has intern() as a builtin
+
+
+# Modes of CachingProxy.__repr__(), see CachingProxy.set_repr_mode()
+REPR_REAL, REPR_FAKE = range(2)
+
+# Modes of the cache, see CachingProxy.set_cache_mode()
+CACHE_NONE, CACHE_KEEP, CACHE_USE, CACHE_PURE = range(4)
+
+# Marker of the empty first slot of the cache of each CachingProxy
+_MISSING = object()
+
+# Cache keys of __getattribute__() shared by all proxies, by attribute name.
+# Programs only use so many distinct attribute names but getattr() with
+# computed names could grow this forever. Past the limit, keys are built
+# for each access instead: correct, only slower to compare and not shared.
+_GETATTR_KEY_CACHE = {}
+_GETATTR_KEY_CACHE_SIZE = 4096
+
+# Caching and pass-through variants of special methods, by method name,
+# set_cache_mode() installs one or the other on CachingProxy
+_CACHING_METHODS = {}
+_PASSTHRU_METHODS = {}
+
+# Primitive non-container, immutable types. NotImplemented must reach the
+# interpreter as-is for comparisons of proxies to fall back properly.
+_PRIMITIVE_BASES = (bool, int, float, str, bytes, type(u""), type(None),
+                    type(NotImplemented))
+
+# Exact types known to be primitive, see _is_primitive_type(). Primitive
+# subclasses are added as they show up and are kept alive on purpose, there
+# are few of them and a weak mapping would slow down each lookup. Other
+# types are not recorded as they would be kept alive just the same.
+_PRIMITIVE_TYPES = dict.fromkeys(_PRIMITIVE_BASES, True)
 
 
 class NotCachedError(Exception):
@@ -17,9 +56,13 @@ class NotCachedError(Exception):
     def __init__(self, obj, attr):
         self.obj = obj
         self.attr = attr
+        self._str = None
 
     def __str__(self):
-        return "%s has no cached response for %s" % (self.obj, self.attr)
+        if self._str is None:
+            self._str = "%s has no cached response for %s" % (
+                self.obj, self.attr)
+        return self._str
 
 
 class CachedException(object):
@@ -33,32 +76,404 @@ class CachedException(object):
         self.exc = exc
 
 
+# Wrappers shared by all argument-less instances of common exceptions
+_SHARED_CACHED_EXCEPTIONS = dict(
+    (exc_type, CachedException(exc_type()))
+    for exc_type in (StopIteration, KeyError, AttributeError))
+
+
 class GhostObject(object):
     """
     Replacement for real object used when working from cache
     """
 
 
-def specialmethod(func):
-    @functools.wraps(func)
-    def helper(self, *args):
-        key_func = lambda: (func.__name__,) + (args)
-        impl_func = lambda obj: (getattr(obj, func.__name__)(*args))
-        return CachingProxy._CachingProxy__cache_resolve(
-            self, key_func, impl_func)
+class _FrozenArg(object):
+    """
+    Hashable stand-in for an unhashable argument (list, dict or set)
+    """
+
+    __slots__ = ['kind', 'items']
+
+    def __init__(self, kind, items):
+        self.kind = kind
+        self.items = items
+
+    def __eq__(self, other):
+        return (type(other) is _FrozenArg and self.kind == other.kind
+                and self.items == other.items)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.kind, self.items))
+
+    def __repr__(self):
+        return "_FrozenArg(%r, %r)" % (self.kind, self.items)
+
+
+class _UnhashableKey(object):
+    """
+    Stand-in for a cache key that is unhashable even after _freeze()
+    """
+
+    __slots__ = ['key']
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return type(other) is _UnhashableKey and self.key == other.key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        # All such keys land in the same bucket of the cache dictionary,
+        # which then compares them with == like an association list would
+        return 0
+
+    def __repr__(self):
+        return "_UnhashableKey(%r)" % (self.key,)
+
+
+def _freeze(value):
+    """
+    Replace lists, dicts and sets in a cache key with hashable stand-ins
+    """
+    if isinstance(value, tuple):
+        return tuple(_freeze(item) for item in value)
+    elif isinstance(value, list):
+        return _FrozenArg('list', tuple(_freeze(item) for item in value))
+    elif isinstance(value, dict):
+        return _FrozenArg('dict', frozenset(
+            (key, _freeze(item)) for key, item in value.items()))
+    elif isinstance(value, set):
+        return _FrozenArg('set', frozenset(value))
+    else:
+        return value
+
+
+def _cache_key(key):
+    """
+    Get the form of a cache key used in the cache, which must be hashable
+    """
+    try:
+        hash(key)
+    except TypeError:
+        key = _freeze(key)
+        try:
+            hash(key)
+        except TypeError:
+            # Arguments such as bytearray or proxies of lists
+            return _UnhashableKey(key)
+    return key
+
+
+def _key_from_json(value):
+    """
+    Rebuild a cache key decoded from JSON, where tuples became lists
+    """
+    if isinstance(value, list):
+        return tuple(_key_from_json(item) for item in value)
+    elif isinstance(value, dict) and "FrozenArg" in value:
+        items = [_key_from_json(item) for item in value['items']]
+        if value['FrozenArg'] == 'list':
+            return _FrozenArg('list', tuple(items))
+        else:
+            return _FrozenArg(value['FrozenArg'], frozenset(items))
+    elif isinstance(value, dict) and "UnhashableKey" in value:
+        return _UnhashableKey(_key_from_json(value['UnhashableKey']))
+    elif isinstance(value, dict) and "CachingProxy" in value:
+        return CachingProxy._from_json_obj(value)
+    else:
+        return value
+
+
+def _is_primitive_type(cls):
+    """
+    Check if cls is a primitive type, remembering primitive subclasses
+    """
+    if issubclass(cls, _PRIMITIVE_BASES):
+        _PRIMITIVE_TYPES[cls] = True
+        return True
+    return False
+
+
+def _wrap(value):
+    """
+    Wrap a value in a new CachingProxy, unless it is a primitive value
+    """
+    primitive = _PRIMITIVE_TYPES.get(type(value))
+    if primitive is None:
+        primitive = _is_primitive_type(type(value))
+    if primitive:
+        return value
+    proxy = object.__new__(CachingProxy)
+    CachingProxy.__init__(proxy, value)
+    return proxy
+
+
+def _exception_state(exc):
+    """
+    Get the state of an exception that its args don't carry, as pickle does
+    """
+    # This covers __dict__ as well as attributes such as ImportError.name
+    reduced = exc.__reduce__()
+    if len(reduced) > 2:
+        return reduced[2]
+    return None
+
+
+def _rebuild_exception(exc_type, args, state):
+    """
+    Create an exception from its args and state
+    """
+    try:
+        # Built-in exceptions set attributes such as StopIteration.value
+        # or UnicodeError.reason in their constructor
+        exc = exc_type(*args)
+    except Exception:
+        # The constructor takes other arguments than the ones kept in args
+        exc = exc_type.__new__(exc_type, *args)
+    exc.args = args
+    if state:
+        exc.__setstate__(state)
+    return exc
+
+
+def _copy_exception(exc):
+    """
+    Copy an exception, leaving out its traceback and context
+    """
+    return _rebuild_exception(type(exc), exc.args, _exception_state(exc))
+
+
+def _wrap_exception(exc):
+    """
+    Wrap an exception in a CachedException, sharing common ones
+    """
+    if not exc.args:
+        shared = _SHARED_CACHED_EXCEPTIONS.get(type(exc))
+        if shared is not None:
+            return shared
+    # Keep a copy, the original carries the frames of the call it came from
+    return CachedException(_copy_exception(exc))
+
+
+def _cache_lookup(self, cache_key):
+    """
+    Look up a cached, wrapped value of a proxy, return _MISSING if absent
+    """
+    # Most proxies only ever see one key, it lives in the first slot. Keys
+    # of __getattribute__() and of methods without arguments are shared
+    # so the identity test usually settles it without comparing tuples.
+    k0 = self._CachingProxy__k0
+    if cache_key is k0 or cache_key == k0:
+        return self._CachingProxy__v0
+    extra = self._CachingProxy__extra
+    if extra is None:
+        return _MISSING
+    return extra.get(cache_key, _MISSING)
+
+
+def _cache_store(self, cache_key, wrapped_value):
+    """
+    Store a cached, wrapped value of a proxy
+    """
+    k0 = self._CachingProxy__k0
+    if k0 is _MISSING or cache_key == k0:
+        self._CachingProxy__k0 = cache_key
+        self._CachingProxy__v0 = wrapped_value
+    else:
+        # Allocate the dictionary only once a second key shows up
+        extra = self._CachingProxy__extra
+        if extra is None:
+            extra = self._CachingProxy__extra = {}
+        extra[cache_key] = wrapped_value
+
+
+def _cache_items(self):
+    """
+    Get a list of (cache_key, wrapped_value) pairs cached by a proxy
+    """
+    k0 = self._CachingProxy__k0
+    if k0 is _MISSING:
+        return []
+    items = [(k0, self._CachingProxy__v0)]
+    extra = self._CachingProxy__extra
+    if extra is not None:
+        items.extend(extra.items())
+    return items
+
+
+def _cache_len(self):
+    """
+    Get the number of responses cached by a proxy
+    """
+    if self._CachingProxy__k0 is _MISSING:
+        return 0
+    extra = self._CachingProxy__extra
+    if extra is None:
+        return 1
+    return 1 + len(extra)
+
+
+def _resolve_none(self, cache_key, impl_func, *impl_args):
+    """
+    Resolve a proxied call in CACHE_NONE mode
+    """
+    # Directly call value (no wrapping!)
+    return impl_func(self._CachingProxy__obj, *impl_args)
+
+
+def _resolve_keep(self, cache_key, impl_func, *impl_args):
+    """
+    Resolve a proxied call in CACHE_KEEP mode
+    """
+    # Compute value and wrap
+    try:
+        wrapped_value = _wrap(impl_func(self._CachingProxy__obj, *impl_args))
+    except Exception as exc:
+        # Keep the exception in cache and let it propagate as-is
+        _cache_store(self, cache_key, _wrap_exception(exc))
+        raise
+    # Keep wrapped value in cache
+    _cache_store(self, cache_key, wrapped_value)
+    return wrapped_value
+
+
+def _resolve_use(self, cache_key, impl_func, *impl_args):
+    """
+    Resolve a proxied call in CACHE_USE mode
+    """
+    # Look for cached, wrapped value
+    wrapped_value = _cache_lookup(self, cache_key)
+    if wrapped_value is _MISSING:
+        # Compute value and wrap
+        try:
+            wrapped_value = _wrap(
+                impl_func(self._CachingProxy__obj, *impl_args))
+        except Exception as exc:
+            # Keep the exception in cache and let it propagate as-is
+            _cache_store(self, cache_key, _wrap_exception(exc))
+            raise
+        # Keep wrapped value in cache
+        _cache_store(self, cache_key, wrapped_value)
+        return wrapped_value
+    # Unwrap and return / raise cached wrapped value. Compare the exact type
+    # as isinstance() would have to look at __class__ of proxied values
+    if type(wrapped_value) is CachedException:
+        # Raise a copy, raising the cached exception itself would attach
+        # the traceback and context of this call to it
+        raise _copy_exception(wrapped_value.exc)
+    else:
+        return wrapped_value
+
+
+def _resolve_pure(self, cache_key, impl_func, *impl_args):
+    """
+    Resolve a proxied call in CACHE_PURE mode
+    """
+    # Look for cached, wrapped value
+    wrapped_value = _cache_lookup(self, cache_key)
+    if wrapped_value is _MISSING:
+        # Raise special exception when cache is empty
+        raise NotCachedError(self._CachingProxy__obj, cache_key)
+    # Unwrap and return / raise cached wrapped value
+    if type(wrapped_value) is CachedException:
+        # Raise a copy, raising the cached exception itself would attach
+        # the traceback and context of this call to it
+        raise _copy_exception(wrapped_value.exc)
+    else:
+        return wrapped_value
+
+
+# Resolvers by cache mode, see CachingProxy.set_cache_mode()
+_RESOLVERS = {
+    CACHE_NONE: _resolve_none,
+    CACHE_KEEP: _resolve_keep,
+    CACHE_USE: _resolve_use,
+    CACHE_PURE: _resolve_pure,
+}
+
+
+def _call_method(obj, name, args):
+    """
+    Call method name of obj, used to implement special methods
+    """
+    return getattr(obj, name)(*args)
+
+
+def _call(obj, args, kwargs):
+    """
+    Call obj itself, used to implement __call__()
+    """
+    return obj(*args, **kwargs)
+
+
+def _named_like(func, helper):
+    """
+    Give helper the name of func, for tracebacks
+    """
+    helper.__name__ = func.__name__
+    helper.__qualname__ = getattr(func, '__qualname__', func.__name__)
     return helper
 
 
+# Source of wrappers generated by specialmethod() and specialmethod_nocache(),
+# they take the same arguments as the wrapped method so that the cache key
+# can be built as a tuple literal (a constant for methods without arguments).
+_CACHING_METHOD_TEMPLATE = """
+def {name}({params}):
+    return CachingProxy._CachingProxy__cache_resolve(
+        self, {key}, _call_method, {name!r}, ({args}))
+"""
+
+_PASSTHRU_METHOD_TEMPLATE = """
+def {name}({params}):
+    return getattr(self._CachingProxy__obj, {name!r})({args})
+"""
+
+
+def _compile_method(func, template):
+    """
+    Generate a wrapper of func from template
+    """
+    code = func.__code__
+    params = code.co_varnames[:code.co_argcount]
+    args = "".join(param + ", " for param in params[1:])
+    if args:
+        key = "_cache_key((%r, %s))" % (func.__name__, args)
+    else:
+        key = "(%r,)" % func.__name__
+    source = template.format(
+        name=func.__name__, params=", ".join(params), key=key, args=args)
+    namespace = {}
+    exec(compile(source, "<%s wrapper>" % func.__name__, "exec"),
+         globals(), namespace)
+    return _named_like(func, namespace[func.__name__])
+
+
+def specialmethod(func):
+    # NOTE: This is used even for cheap methods such as __len__() or
+    # __hash__(), the cache is the only source of their results in
+    # CACHE_PURE mode, where the wrapped object is just a GhostObject.
+    name = intern(func.__name__)
+    _CACHING_METHODS[name] = _compile_method(func, _CACHING_METHOD_TEMPLATE)
+    _PASSTHRU_METHODS[name] = specialmethod_nocache(func)
+    # CachingProxy starts in CACHE_NONE mode
+    return _PASSTHRU_METHODS[name]
+
+
 def specialmethod_nocache(func):
-    @functools.wraps(func)
-    def helper(self, *args):
-        return getattr(self._CachingProxy__obj, func.__name__)(*args)
-    return helper
+    return _compile_method(func, _PASSTHRU_METHOD_TEMPLATE)
 
 
 class CachingProxy(object):
 
-    REPR_REAL, REPR_FAKE = range(2)
+    REPR_REAL, REPR_FAKE = REPR_REAL, REPR_FAKE
 
     repr_mode = REPR_REAL
 
@@ -75,24 +490,27 @@ class CachingProxy(object):
         By default, REPR_REAL is used so each cached object will
         be easily identifieable as such.
         """
-        cls.repr_mode = True
-
-    def __repr__(self):
-        if CachingProxy.repr_mode == CachingProxy.REPR_REAL:
-            return ("<CachingProxy over %r with keys:%r values:%r"
-                    " at %#0xlp>" % (
-                        self.__obj, self.__keys, self.__values, id(self)))
-        elif CachingProxy.repr_mode == CachingProxy.REPR_FAKE:
-            key_func = lambda: '__repr__'
-            impl_func = lambda obj: obj.__repr__()
+        if mode not in (REPR_REAL, REPR_FAKE):
+            raise ValueError("unsupported repr mode: %r" % (mode,))
+        cls.repr_mode = mode
+
+    def __repr__(self, _id=id, _real=REPR_REAL, _fake=REPR_FAKE):
+        # NOTE: the keyword arguments are bound once, at definition time,
+        # see __getattribute__()
+        mode = CachingProxy.repr_mode
+        if mode == _real:
+            return "<CachingProxy over %r with %d entries at 0x%x>" % (
+                self.__obj, _cache_len(self), _id(self))
+        elif mode == _fake:
             try:
-                return self.__cache_resolve(key_func, impl_func)
+                return self.__cache_resolve('__repr__', repr)
             except NotCachedError:
-                return ("<(fallback mode)CachingProxy over %r with keys:%r"
-                        " values:%r at %#0xlp>") % (
-                            self.__obj, self.__keys, self.__values, id(self))
+                return ("<(fallback mode)CachingProxy over %r with %d entries"
+                        " at 0x%x>") % (
+                            self.__obj, _cache_len(self), _id(self))
 
-    CACHE_NONE, CACHE_KEEP, CACHE_USE, CACHE_PURE = range(4)
+    CACHE_NONE, CACHE_KEEP, CACHE_USE, CACHE_PURE = (
+        CACHE_NONE, CACHE_KEEP, CACHE_USE, CACHE_PURE)
 
     cache_mode = CACHE_NONE
 
@@ -134,100 +552,43 @@ class CachingProxy(object):
         nothing was being intercepted and not to consume extra memory.
         It should be safe for all kinds of code.
         """
+        # Validate the mode before touching the class
+        try:
+            resolve = _RESOLVERS[mode]
+        except (KeyError, TypeError):
+            raise ValueError("unsupported cache mode: %r" % (mode,))
         cls.cache_mode = mode
+        # Special methods don't need to go through the resolver at all
+        # when the cache is disabled
+        if mode == CACHE_NONE:
+            methods = _PASSTHRU_METHODS
+        else:
+            methods = _CACHING_METHODS
+        for name, method in methods.items():
+            setattr(cls, name, method)
+        cls.__cache_resolve = resolve
 
-    def __cache_resolve(self, key_func, impl_func):
-        keys = self.__keys
-        values = self.__values
-        obj = self.__obj
-
-        def call_key():
-            return key_func()
-
-        def call_impl():
-            try:
-                value = impl_func(obj)
-            except Exception as exc:
-                return exc
-            else:
-                return CachingProxy(value)
-
-        def store(cache_key, wrapped_value):
-            try:
-                index = keys.index(cache_key)
-            except ValueError:
-                keys.append(cache_key)
-                values.append(wrapped_value)
-            else:
-                keys[index] = cache_key
-                values[index] = wrapped_value
-
-        def lookup(cache_key):
-            try:
-                index = keys.index(cache_key)
-            except ValueError:
-                raise
-            else:
-                return values[index]
-
-        def return_wrapped(wrapped_value):
-            if isinstance(wrapped_value, CachedException):
-                raise CachingProxy(wrapped_value.exc)
-            else:
-                return wrapped_value
-
-        if CachingProxy.cache_mode == CachingProxy.CACHE_NONE:
-            # Directly call value (no wrapping!)
-            return impl_func(obj)
-        elif CachingProxy.cache_mode == CachingProxy.CACHE_KEEP:
-            # Compute value and wrap
-            wrapped_value = call_impl()
-            # Compute cache key
-            cache_key = call_key()
-            # Keep wrapped value in cache
-            store(cache_key, wrapped_value)
-            # Unwrap and return / raise wrapped value
-            return return_wrapped(wrapped_value)
-        elif CachingProxy.cache_mode == CachingProxy.CACHE_USE:
-            # Compute cache key
-            cache_key = call_key()
-            # Look for cached, wrapped value
-            try:
-                wrapped_value = lookup(cache_key)
-            except ValueError:
-                # Compute value and wrap
-                wrapped_value = call_impl()
-                # Keep wrapped value in cache
-                store(cache_key, wrapped_value)
-            # Unwrap and return / raise wrapped value
-            return return_wrapped(wrapped_value)
-        elif CachingProxy.cache_mode == CachingProxy.CACHE_PURE:
-            # Compute cache key
-            cache_key = call_key()
-            # Look for cached, wrapped value
-            try:
-                wrapped_value = lookup(cache_key)
-            except ValueError:
-                # Raise special exception when cache is empty
-                raise NotCachedError(obj, cache_key)
-            else:
-                # Unwrap and return / raise cached wrapped value
-                return return_wrapped(wrapped_value)
+    # Resolver for the current cache_mode, see set_cache_mode()
+    __cache_resolve = _resolve_none
 
-    __slots__ = ['_CachingProxy__obj', '_CachingProxy__keys',
-                 '_CachingProxy__values']
+    __slots__ = ['_CachingProxy__obj', '_CachingProxy__k0',
+                 '_CachingProxy__v0', '_CachingProxy__extra']
 
     def __new__(cls, obj):
         # Don't wrap over primitive non-container, immutable types
-        if isinstance(obj, (bool, float, int, str, unicode)) or obj is None:
+        primitive = _PRIMITIVE_TYPES.get(type(obj))
+        if primitive is None:
+            primitive = _is_primitive_type(type(obj))
+        if primitive:
             return obj
         else:
-            return super(CachingProxy, cls).__new__(cls, obj)
+            return super(CachingProxy, cls).__new__(cls)
 
     def __init__(self, obj):
         object.__setattr__(self, "_CachingProxy__obj", obj)
-        object.__setattr__(self, "_CachingProxy__keys", [])
-        object.__setattr__(self, "_CachingProxy__values", [])
+        object.__setattr__(self, "_CachingProxy__k0", _MISSING)
+        object.__setattr__(self, "_CachingProxy__v0", None)
+        object.__setattr__(self, "_CachingProxy__extra", None)
 
     @specialmethod
     def __str__(self):
@@ -286,9 +647,14 @@ class CachingProxy(object):
         pass
 
     def __call__(self, *args, **kwargs):
-        key_func = lambda: ('__call__', args, kwargs)
-        impl_func = lambda obj: obj(*args, **kwargs)
-        return self.__cache_resolve(key_func, impl_func)
+        # Keyword arguments are sorted so that the key is hashable unless
+        # the values themselves are not, see _cache_key()
+        if kwargs:
+            cache_key = _cache_key(
+                ('__call__', args, tuple(sorted(kwargs.items()))))
+        else:
+            cache_key = _cache_key(('__call__', args, ()))
+        return self.__cache_resolve(cache_key, _call, args, kwargs)
 
     @specialmethod
     def __getitem__(self, key):
@@ -318,52 +684,174 @@ class CachingProxy(object):
     def __contains__(self, item):
         pass
 
-    def __getattribute__(self, attr):
-        # Allow real access to the two special values
-        if attr in ('_CachingProxy__obj', '_CachingProxy__keys',
-                    '_CachingProxy__values', '_CachingProxy__cache_resolve'):
-            return object.__getattribute__(self, attr)
-        # Skip wrapping on some special things
-        if attr in ("__class__", "__dict__"):
-            return getattr(self, attr)
-        # Return values that are in cache directly
-        key_func = lambda: ('__getattribute__', attr)
-        impl_func = lambda obj: getattr(obj, attr)
-        return self.__cache_resolve(key_func, impl_func)
-
-    @classmethod
-    def _to_json_obj(cls, instance):
-        return {
-            'CachingProxy': True,
-            'keys': instance.__keys,
-            'values': instance.__values
-        }
+    def __getattribute__(
+            self, attr, _getattr=getattr, _oga=object.__getattribute__,
+            _own_attrs=frozenset([
+                # Allow real access to the internal state of the proxy
+                '_CachingProxy__obj', '_CachingProxy__k0',
+                '_CachingProxy__v0', '_CachingProxy__extra',
+                '_CachingProxy__cache_resolve',
+                # Skip wrapping on some special things
+                '__class__', '__dict__']),
+            _key_cache=_GETATTR_KEY_CACHE,
+            _key_cache_size=_GETATTR_KEY_CACHE_SIZE, _len=len,
+            _intern=intern, _str=str):
+        # NOTE: the keyword arguments are bound once, at definition time,
+        # so that this method, called on each attribute access, only deals
+        # with local variables.
+        if attr in _own_attrs:
+            return _oga(self, attr)
+        cache_key = _key_cache.get(attr)
+        if cache_key is None:
+            # intern() only takes exact strings, not str subclasses
+            if type(attr) is _str and _len(_key_cache) < _key_cache_size:
+                cache_key = _key_cache.setdefault(
+                    attr, ('__getattribute__', _intern(attr)))
+            else:
+                cache_key = ('__getattribute__', attr)
+        # Return values that are in cache directly. Look up the interned
+        # name from the key so that dictionary probes hit on identity.
+        return _oga(self, '_CachingProxy__cache_resolve')(
+            cache_key, _getattr, cache_key[1])
 
     @classmethod
     def _from_json_obj(cls, json_obj):
         self = cls(GhostObject)
-        keys = self.__keys = []
         # Transform lists to tuples as that information is lost after
-        # running json.loads(json.dumps(...)) and list.index() depends on it
-        for key in json_obj['keys']:
-            if isinstance(key, list):
-                keys.append(tuple(key))
-            else:
-                keys.append(key)
+        # running json.loads(json.dumps(...)) and dict keys must be hashable
+        keys = [_key_from_json(key) for key in json_obj['keys']]
         # Transform dicts with 'CachingProxy' in them to instances
-        values = self.__values = []
-        for value in json_obj['values']:
+        for key, value in zip(keys, json_obj['values']):
             if isinstance(value, dict) and "CachingProxy" in value:
-                values.append(cls._from_json_obj(value))
+                _cache_store(self, key, cls._from_json_obj(value))
+            elif isinstance(value, dict) and "NotImplemented" in value:
+                _cache_store(self, key, NotImplemented)
+            elif isinstance(value, dict) and "CachedException" in value:
+                _cache_store(self, key, CachedException(_rebuild_exception(
+                    _exception_type_from_json(value['CachedException']),
+                    tuple(value['args']), value['state'])))
             else:
-                values.append(value)
+                _cache_store(self, key, value)
         return self
 
     @classmethod
-    def to_cache(cls, instance):
-        return json.dumps(instance, default=cls._to_json_obj)
+    def to_cache(cls, instance, fmt='pickle'):
+        """
+        Serialize the cache of a proxy (recursively).
+
+        There are two formats:
+
+            'pickle' - compact binary format (bytes), the default
+            'json' - human readable text format (str)
+
+        Only load pickled caches coming from a trusted source.
+        """
+        if fmt == 'pickle':
+            stream = io.BytesIO()
+            _CachePickler(stream, pickle.HIGHEST_PROTOCOL).dump(instance)
+            return stream.getvalue()
+        elif fmt == 'json':
+            return json.dumps(instance, cls=_CacheEncoder)
+        else:
+            raise ValueError("unsupported cache format: %r" % fmt)
 
     @classmethod
-    def from_cache(cls, cache):
-        json_obj = json.loads(cache)
-        return cls._from_json_obj(json_obj)
+    def from_cache(cls, cache, fmt='pickle'):
+        """
+        Create a proxy from a cache created by to_cache()
+        """
+        if fmt == 'pickle':
+            return _CacheUnpickler(io.BytesIO(cache)).load()
+        elif fmt == 'json':
+            json_obj = json.loads(cache)
+            return cls._from_json_obj(json_obj)
+        else:
+            raise ValueError("unsupported cache format: %r" % fmt)
+
+
+def _from_pickle(items):
+    """
+    Create a proxy from (cache_key, wrapped_value) pairs, used by pickle
+    """
+    self = CachingProxy(GhostObject)
+    for key, value in items:
+        _cache_store(self, key, value)
+    return self
+
+
+class _CachePickler(pickle.Pickler):
+    """
+    Pickler that stores proxies as their cached pairs and exceptions as
+    their arguments and attributes
+    """
+
+    # NOTE: This is done here rather than in CachingProxy.__reduce__() so
+    # that copy.copy() and pickle.dumps() of a proxy still reach the
+    # wrapped object, like every other attribute does.
+    def persistent_id(self, obj):
+        if type(obj) is CachingProxy:
+            return ('CachingProxy', _cache_items(obj))
+        elif isinstance(obj, BaseException):
+            return ('Exception', type(obj), obj.args, _exception_state(obj))
+        return None
+
+
+class _CacheUnpickler(pickle.Unpickler):
+    """
+    Unpickler of caches written by _CachePickler
+    """
+
+    def persistent_load(self, pid):
+        if pid[0] == 'CachingProxy':
+            return _from_pickle(pid[1])
+        elif pid[0] == 'Exception':
+            return _rebuild_exception(pid[1], pid[2], pid[3])
+        raise pickle.UnpicklingError("unsupported persistent id: %r" % (pid,))
+
+
+def _exception_type_from_json(name):
+    """
+    Look up an exception class by the "module:qualname" name it was saved as
+    """
+    module_name, qualname = name.split(":", 1)
+    obj = importlib.import_module(module_name)
+    for attr in qualname.split("."):
+        obj = getattr(obj, attr)
+    if not (isinstance(obj, type) and issubclass(obj, BaseException)):
+        raise ValueError("not an exception class: %r" % name)
+    return obj
+
+
+class _CacheEncoder(json.JSONEncoder):
+    """
+    JSON encoder that knows about CachingProxy instances, cache keys and
+    cached exceptions
+    """
+
+    def default(self, obj):
+        if isinstance(obj, CachingProxy):
+            items = _cache_items(obj)
+            return {
+                'CachingProxy': True,
+                'keys': [key for key, value in items],
+                'values': [value for key, value in items]
+            }
+        elif type(obj) is _FrozenArg:
+            return {
+                'FrozenArg': obj.kind,
+                'items': list(obj.items)
+            }
+        elif type(obj) is _UnhashableKey:
+            return {'UnhashableKey': obj.key}
+        elif obj is NotImplemented:
+            return {'NotImplemented': True}
+        elif type(obj) is CachedException:
+            exc_type = type(obj.exc)
+            return {
+                'CachedException': "%s:%s" % (
+                    exc_type.__module__,
+                    getattr(exc_type, '__qualname__', exc_type.__name__)),
+                'args': list(obj.exc.args),
+                'state': _exception_state(obj.exc)
+            }
+        return json.JSONEncoder.default(self, obj)
@@ -8,6 +8,15 @@
 
 from setuptools import setup
 
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    # Cython is optional, without it the pure-python module is installed
+    ext_modules = []
+else:
+    ext_modules = cythonize(
+        "cachingproxy.py", compiler_directives={'language_level': 3})
+
 
 setup(
     name='cachingproxy',
@@ -15,6 +24,7 @@ setup(
     author="Zygmunt Krynicki",
     author_email="zkrynicki@gmail.com",
     py_modules=["cachingproxy"],
+    ext_modules=ext_modules,
     description=(
         "CachingProxy magically records usage of arbitrary objects"
         " and allows you to replay the same behavior later (with serializable"
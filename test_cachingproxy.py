@@ -0,0 +1,263 @@
+# Copyright 2013 Canonical Ltd.
+# Written by:
+#   Zygmunt Krynicki <zygmunt.krynicki@canonical.com>
+#
+# See COPYING for license information (LGPLv3)
+
+import copy
+import gc
+import unittest
+import weakref
+
+from cachingproxy import CachingProxy
+
+
+class CustomError(Exception):
+
+    def __init__(self, code, message):
+        super(CustomError, self).__init__(message)
+        self.code = code
+
+
+class CachingProxyTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        # The cache mode is global, don't leak it into other tests
+        CachingProxy.set_cache_mode(CachingProxy.CACHE_NONE)
+        CachingProxy.set_repr_mode(CachingProxy.REPR_REAL)
+
+    def replay(self, proxy, fmt):
+        """
+        Round-trip the cache of proxy and switch to CACHE_PURE
+        """
+        cache = CachingProxy.to_cache(proxy, fmt)
+        CachingProxy.set_cache_mode(CachingProxy.CACHE_PURE)
+        return CachingProxy.from_cache(cache, fmt)
+
+
+class UnhashableArgumentTests(CachingProxyTestCase):
+
+    def check_replay(self, fmt):
+        CachingProxy.set_cache_mode(CachingProxy.CACHE_KEEP)
+        func = CachingProxy(lambda *args, **kwargs: repr((args, kwargs)))
+        calls = [
+            ((1, 2), {}),
+            ([1, 2], {}),
+            ({'a': [1, 2]}, {}),
+            ({1: 'int', 'b': 'str'}, {}),
+            ({3, 4}, {}),
+            ((), {'x': [1]}),
+            ((), {'x': (1,)}),
+        ]
+        expected = [func(arg, **kwargs) for arg, kwargs in calls]
+        replayed = self.replay(func, fmt)
+        self.assertEqual(
+            [replayed(arg, **kwargs) for arg, kwargs in calls], expected)
+
+    def test_replay_pickle(self):
+        self.check_replay('pickle')
+
+    def test_replay_json(self):
+        self.check_replay('json')
+
+    def test_still_unhashable_second_key(self):
+        for mode in (CachingProxy.CACHE_KEEP, CachingProxy.CACHE_USE):
+            CachingProxy.set_cache_mode(mode)
+            func = CachingProxy(len)
+            self.assertEqual(func(bytearray(b'ab')), 2)
+            self.assertEqual(func(bytearray(b'abc')), 3)
+            self.assertEqual(func(CachingProxy({'a': [1]})['a']), 1)
+            self.assertEqual(func(bytearray(b'abc')), 3)
+        replayed = self.replay(func, 'pickle')
+        self.assertEqual(replayed(bytearray(b'ab')), 2)
+        self.assertEqual(replayed(bytearray(b'abc')), 3)
+
+    def test_list_and_tuple_are_distinct(self):
+        CachingProxy.set_cache_mode(CachingProxy.CACHE_USE)
+        func = CachingProxy(lambda arg: type(arg).__name__)
+        self.assertEqual(func((1, 2)), 'tuple')
+        self.assertEqual(func([1, 2]), 'list')
+
+    def test_method_with_list_result(self):
+        for fmt in ('pickle', 'json'):
+            CachingProxy.set_cache_mode(CachingProxy.CACHE_KEEP)
+            d = CachingProxy({'a': [1, 2]})
+            self.assertEqual(d.get('a'), [1, 2])
+            self.assertEqual(self.replay(d, fmt).get('a'), [1, 2])
+
+
+class CacheModeTests(CachingProxyTestCase):
+
+    def test_invalid_mode_leaves_class_alone(self):
+        CachingProxy.set_cache_mode(CachingProxy.CACHE_KEEP)
+        for mode in (42, None, [1]):
+            self.assertRaises(ValueError, CachingProxy.set_cache_mode, mode)
+        self.assertEqual(CachingProxy.cache_mode, CachingProxy.CACHE_KEEP)
+        proxy = CachingProxy([1, 2])
+        self.assertEqual(len(proxy), 2)
+
+
+class AttributeTests(CachingProxyTestCase):
+
+    def test_str_subclass_attribute_name(self):
+        class Name(str):
+            pass
+        for mode in (CachingProxy.CACHE_NONE, CachingProxy.CACHE_KEEP):
+            CachingProxy.set_cache_mode(mode)
+            proxy = CachingProxy([])
+            getattr(proxy, Name('append'))(1)
+            self.assertEqual(getattr(proxy, Name('count'))(1), 1)
+
+
+class PickleTests(CachingProxyTestCase):
+
+    def test_copy_reaches_wrapped_object(self):
+        proxy = CachingProxy([1, 2])
+        self.assertIs(type(copy.copy(proxy)), list)
+        self.assertIs(type(copy.deepcopy(proxy)), list)
+
+    def test_exception_with_custom_init(self):
+        def fail():
+            raise CustomError(404, "not found")
+        CachingProxy.set_cache_mode(CachingProxy.CACHE_KEEP)
+        func = CachingProxy(fail)
+        self.assertRaises(CustomError, func)
+        for fmt in ('pickle', 'json'):
+            CachingProxy.set_cache_mode(CachingProxy.CACHE_KEEP)
+            with self.assertRaises(CustomError) as context:
+                self.replay(func, fmt)()
+            self.assertEqual(context.exception.args, ("not found",))
+            self.assertEqual(context.exception.code, 404)
+
+
+class ReprTests(CachingProxyTestCase):
+
+    def test_real_repr_follows_wrapped_object(self):
+        obj = [1]
+        proxy = CachingProxy(obj)
+        self.assertIn("[1]", repr(proxy))
+        obj.append(2)
+        self.assertIn("[1, 2]", repr(proxy))
+
+    def test_real_repr_counts_entries(self):
+        CachingProxy.set_cache_mode(CachingProxy.CACHE_KEEP)
+        proxy = CachingProxy([1, 2])
+        self.assertIn("with 0 entries", repr(proxy))
+        len(proxy)
+        self.assertIn("with 1 entries", repr(proxy))
+        proxy.count(1)
+        proxy.index(2)
+        self.assertIn("with 3 entries", repr(proxy))
+
+    def test_repr_mode_switches_back(self):
+        proxy = CachingProxy([1, 2])
+        CachingProxy.set_repr_mode(CachingProxy.REPR_FAKE)
+        self.assertEqual(repr(proxy), "[1, 2]")
+        CachingProxy.set_repr_mode(CachingProxy.REPR_REAL)
+        self.assertTrue(repr(proxy).startswith("<CachingProxy over [1, 2]"))
+
+    def test_invalid_mode_is_rejected(self):
+        for mode in (42, None, [1]):
+            self.assertRaises(ValueError, CachingProxy.set_repr_mode, mode)
+        self.assertEqual(CachingProxy.repr_mode, CachingProxy.REPR_REAL)
+        self.assertTrue(repr(CachingProxy([])).startswith("<CachingProxy"))
+
+
+class PrimitiveTypeTests(CachingProxyTestCase):
+
+    def test_primitive_subclass_is_not_wrapped(self):
+        class Name(str):
+            pass
+        name = Name("x")
+        self.assertIs(CachingProxy(name), name)
+
+    def test_wrapped_class_is_not_kept_alive(self):
+        class Thing(object):
+            pass
+        CachingProxy(Thing())
+        ref = weakref.ref(Thing)
+        del Thing
+        gc.collect()
+        self.assertIsNone(ref())
+
+
+class ExceptionTests(CachingProxyTestCase):
+
+    def test_replayed_exception_is_fresh(self):
+        CachingProxy.set_cache_mode(CachingProxy.CACHE_USE)
+        proxy = CachingProxy({})
+        self.assertRaises(KeyError, proxy.__getitem__, 'a')
+        try:
+            raise ValueError("context")
+        except ValueError:
+            try:
+                proxy['a']
+            except KeyError as exc:
+                first = exc
+        try:
+            proxy['a']
+        except KeyError as exc:
+            second = exc
+        self.assertIsNot(first, second)
+        self.assertIsNone(second.__context__)
+        self.assertEqual(second.args, ('a',))
+
+    def test_exception_state_is_replayed(self):
+        errors = [
+            StopIteration(5),
+            ImportError("no module", name='mod'),
+            UnicodeDecodeError('ascii', b'\xff', 0, 1, 'bad byte'),
+        ]
+
+        def fail(index):
+            raise errors[index]
+        CachingProxy.set_cache_mode(CachingProxy.CACHE_KEEP)
+        func = CachingProxy(fail)
+        for index, error in enumerate(errors):
+            self.assertRaises(type(error), func, index)
+        replayed = self.replay(func, 'pickle')
+        for proxy in (func, replayed):
+            CachingProxy.set_cache_mode(CachingProxy.CACHE_PURE)
+            for index, error in enumerate(errors):
+                with self.assertRaises(type(error)) as context:
+                    proxy(index)
+                self.assertEqual(str(context.exception), str(error))
+            with self.assertRaises(StopIteration) as context:
+                proxy(0)
+            self.assertEqual(context.exception.value, 5)
+            with self.assertRaises(ImportError) as context:
+                proxy(1)
+            self.assertEqual(context.exception.name, 'mod')
+
+    def test_exception_replays_from_json(self):
+        def fail():
+            raise ImportError("no module", name='mod')
+        CachingProxy.set_cache_mode(CachingProxy.CACHE_KEEP)
+        func = CachingProxy(fail)
+        self.assertRaises(ImportError, func)
+        with self.assertRaises(ImportError) as context:
+            self.replay(func, 'json')()
+        self.assertEqual(context.exception.args, ("no module",))
+        self.assertEqual(context.exception.name, 'mod')
+
+    def test_shared_exception_is_not_mutated(self):
+        def fail():
+            raise StopIteration()
+        CachingProxy.set_cache_mode(CachingProxy.CACHE_USE)
+        func = CachingProxy(fail)
+        self.assertRaises(StopIteration, func)
+        try:
+            raise ValueError("context")
+        except ValueError:
+            self.assertRaises(StopIteration, func)
+        # Another proxy replaying the same kind of exception
+        other = CachingProxy(fail)
+        self.assertRaises(StopIteration, other)
+        try:
+            other()
+        except StopIteration as exc:
+            self.assertIsNone(exc.__context__)
+
+
+if __name__ == '__main__':
+    unittest.main()